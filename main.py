@@ -1,13 +1,24 @@
 import os
 import logging
+import heapq
 import mimetypes
-from collections import defaultdict
-from typing import List, Dict, Optional
+import stat
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from functools import lru_cache
+from operator import attrgetter
+from typing import List, Dict, Optional, Tuple
+from urllib.parse import urlencode
 from pydantic import BaseModel, Field, field_validator, computed_field, ConfigDict
-from humanize import naturalsize
 from datetime import datetime
+import orjson
 from fastapi import FastAPI, Depends, HTTPException, Query
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 
 # ---------- Logging Setup ----------
 def get_logger():
@@ -24,6 +35,20 @@ def get_logger():
     return logger
 
 
+# ---------- Formatting ----------
+@lru_cache(maxsize=8192)
+def human_size(num_bytes: int) -> str:
+    """Format a byte count with binary units (e.g. '1.5 MB')."""
+    if num_bytes < 1024:
+        return f"{num_bytes} B"
+    size = num_bytes / 1024
+    for unit in ("KB", "MB", "GB", "TB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} PB"
+
+
 # ---------- Pydantic Models ----------
 class ExtensionStats(BaseModel):
     """Statistics for a specific file extension."""
@@ -31,12 +56,7 @@ class ExtensionStats(BaseModel):
     
     count: int = Field(..., ge=1, description="Number of files with this extension")
     size: int = Field(..., ge=0, description="Total size of all files with this extension in bytes")
-    
-    @computed_field
-    @property
-    def size_human(self) -> str:
-        """Human-readable size representation."""
-        return naturalsize(self.size)
+    size_human: str = Field(..., description="Human-readable size representation")
 
 
 class FileEntry(BaseModel):
@@ -55,12 +75,7 @@ class FileEntry(BaseModel):
     mode: int = Field(..., ge=0, description="File mode/permissions")
     owner_uid: int = Field(..., ge=0, description="Owner user ID")
     group_gid: int = Field(..., ge=0, description="Owner group ID")
-    
-    @computed_field
-    @property
-    def size_human(self) -> str:
-        """Human-readable size representation."""
-        return naturalsize(self.size)
+    size_human: str = Field(..., description="Human-readable size representation")
     
     @field_validator('path')
     @classmethod
@@ -80,22 +95,7 @@ class Report(BaseModel):
     extensions: Dict[str, ExtensionStats] = Field(..., description="Statistics grouped by file extension")
     largest_files: List[FileEntry] = Field(..., max_length=50, description="List of largest files (up to 10)")
     all_files: List[FileEntry] = Field(..., description="Complete list of all analyzed files")
-    
-    @computed_field
-    @property
-    def total_size_human(self) -> str:
-        """Human-readable total size representation."""
-        return naturalsize(self.total_size)
-    
-    @field_validator('largest_files')
-    @classmethod
-    def validate_largest_files(cls, v: List[FileEntry]) -> List[FileEntry]:
-        """Ensure largest_files is sorted by size descending."""
-        if len(v) > 1:
-            for i in range(len(v) - 1):
-                if v[i].size < v[i + 1].size:
-                    raise ValueError('largest_files must be sorted by size in descending order')
-        return v
+    total_size_human: str = Field(..., description="Human-readable total size representation")
 
 
 class PaginatedFiles(BaseModel):
@@ -160,93 +160,508 @@ class FileInfoResponse(BaseModel):
 
 
 # ---------- Logic ----------
-def collect_file_stats(root_folder: str, logger: logging.Logger, extension_filter: Optional[str] = None) -> Report:
-    file_count = 0
-    total_size = 0
-    extensions = defaultdict(lambda: {"count": 0, "size": 0})
-    all_files = []
-
-    for dirpath, _, filenames in os.walk(root_folder):
-        for f in filenames:
-            file_path = os.path.join(dirpath, f)
-            try:
-                stats = os.stat(file_path, follow_symlinks=False)
-                size = stats.st_size
-                
-                ext = os.path.splitext(f)[1].lower()
-                
+DEFAULT_STAT_THREADS = min(32, (os.cpu_count() or 1) * 4)
+STAT_BATCH_SIZE = 1024
+# Scan and stat relative to an open directory fd (fstatat) where the platform allows it
+USE_DIR_FD = os.scandir in os.supports_fd and os.stat in os.supports_dir_fd
+NDJSON_CHUNK_ROWS = 1000
+# Pages ending within this many rows use a partial heap selection instead of the full sort
+PARTIAL_SORT_WINDOW = 500
+STREAM_CHUNK_SIZE = 1 << 20
+SAFE_PATH_CACHE_TTL = 5.0
+SAFE_PATH_CACHE_SIZE = 4096
+SCAN_CACHE_SIZE = 32
+# Directories the API may analyze or serve files from, separated by os.pathsep; unset allows any path
+ALLOWED_ROOTS = tuple(
+    os.path.realpath(root) for root in os.environ.get("ALLOWED_ROOTS", "").split(os.pathsep) if root
+)
+
+_resolved_path_cache: Dict[str, tuple] = {}
+_scan_cache: "OrderedDict[tuple, _CachedScan]" = OrderedDict()
+_scan_cache_lock = threading.Lock()
+
+
+@dataclass(slots=True)
+class _RawEntry:
+    """Stat data for one file, as collected by the directory walk."""
+    size: int
+    path: str
+    name: str
+    ext: str
+    mtime: float
+    ctime: float
+    atime: float
+    is_symlink: bool
+    ino: int
+    mode: int
+    uid: int
+    gid: int
+
+
+# Largest first, ties broken by path so the order is stable across scans
+_ROW_ORDER = attrgetter("size", "path")
+
+
+def _open_dir(dirpath: str) -> Optional[int]:
+    """Open a directory fd for fd-relative scandir/stat, or return None where unsupported."""
+    if not USE_DIR_FD:
+        return None
+    return os.open(dirpath, os.O_RDONLY | os.O_DIRECTORY)
+
+
+def _stat_entries(dirpath: str, dir_fd: Optional[int], entries: List[tuple], logger: logging.Logger):
+    """Stat a batch of (name, extension, is_symlink) entries of one directory.
+
+    Returns their rows and per-extension counts and sizes. With a dir_fd each
+    stat is an fstatat on the bare name, avoiding a full path lookup per file.
+    """
+    rows = []
+    ext_count = {}
+    ext_size = {}
+
+    for name, ext, is_symlink in entries:
+        path = os.path.join(dirpath, name)
+        try:
+            if dir_fd is not None:
+                stats = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+            else:
+                stats = os.stat(path, follow_symlinks=False)
+        except OSError as e:
+            logger.warning(f"Failed to process {path}: {e}")
+            continue
+
+        size = stats.st_size
+        ext_count[ext] = ext_count.get(ext, 0) + 1
+        ext_size[ext] = ext_size.get(ext, 0) + size
+
+        rows.append(_RawEntry(
+            size, path, name, ext,
+            stats.st_mtime, stats.st_ctime, stats.st_atime, is_symlink,
+            stats.st_ino, stats.st_mode, stats.st_uid, stats.st_gid,
+        ))
+
+    return rows, ext_count, ext_size
+
+
+def _stat_batch(dirpath: str, entries: List[tuple], logger: logging.Logger):
+    """Stat a deferred batch of a large directory's entries on its own directory fd."""
+    try:
+        dir_fd = _open_dir(dirpath)
+    except OSError as e:
+        logger.warning(f"Failed to scan {dirpath}: {e}")
+        return [], {}, {}, [], []
+
+    try:
+        rows, ext_count, ext_size = _stat_entries(dirpath, dir_fd, entries, logger)
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+
+    # Same shape as _scan_dir results, with no subdirectories or further batches
+    return rows, ext_count, ext_size, [], []
+
+
+def _scan_dir(dirpath: str, logger: logging.Logger, ext_filter: Optional[str] = None):
+    """Scan a single directory level.
+
+    Returns its file rows, per-extension counts and sizes, subdirectories and any further
+    (dirpath, entries) batches to stat, so very large directories spread their stat
+    calls across the pool instead of serialising them in one task.
+    """
+    entries = []
+    subdirs = []
+    dir_fd = None
+
+    try:
+        dir_fd = _open_dir(dirpath)
+        it = os.scandir(dirpath if dir_fd is None else dir_fd)
+    except OSError as e:
+        logger.warning(f"Failed to scan {dirpath}: {e}")
+        if dir_fd is not None:
+            os.close(dir_fd)
+        return [], {}, {}, subdirs, []
+
+    try:
+        with it:
+            while True:
+                # Errors mid-readdir end this directory's listing, keeping what was read so far
+                try:
+                    entry = next(it)
+                except StopIteration:
+                    break
+                except OSError as e:
+                    logger.warning(f"Failed to scan {dirpath}: {e}")
+                    break
+
+                # As with os.walk, entries whose type cannot be determined (e.g. symlink
+                # loops) count as files, and symlinked directories are listed but not followed
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                try:
+                    is_symlink = entry.is_symlink()
+                except OSError:
+                    is_symlink = False
+
+                if is_dir:
+                    if not is_symlink:
+                        subdirs.append(os.path.join(dirpath, entry.name))
+                    continue
+
+                # Extensions repeat across millions of files; intern them so rows share one string
+                ext = sys.intern(os.path.splitext(entry.name)[1].lower())
+
                 # Apply extension filter if provided
-                if extension_filter and ext != extension_filter.lower():
+                if ext_filter and ext != ext_filter:
                     continue
-                
-                total_size += size
-                file_count += 1
-
-                extensions[ext]["count"] += 1
-                extensions[ext]["size"] += size
-
-                file_entry = FileEntry(
-                    size=size,
-                    path=os.path.abspath(file_path),
-                    name=f,
-                    extension=ext,
-                    modified_time=datetime.fromtimestamp(stats.st_mtime),
-                    created_time=datetime.fromtimestamp(stats.st_ctime),
-                    accessed_time=datetime.fromtimestamp(stats.st_atime),
-                    is_symlink=os.path.islink(file_path),
-                    inode=stats.st_ino,
-                    mode=stats.st_mode,
-                    owner_uid=stats.st_uid,
-                    group_gid=stats.st_gid,
-                )
-                all_files.append(file_entry)
-
-            except Exception as e:
-                logger.warning(f"Failed to process {file_path}: {e}")
-
-    all_files.sort(key=lambda x: x.size, reverse=True)
+
+                entries.append((entry.name, ext, is_symlink))
+
+        rows, ext_count, ext_size = _stat_entries(dirpath, dir_fd, entries[:STAT_BATCH_SIZE], logger)
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+
+    batches = [
+        (dirpath, entries[i:i + STAT_BATCH_SIZE])
+        for i in range(STAT_BATCH_SIZE, len(entries), STAT_BATCH_SIZE)
+    ]
+    return rows, ext_count, ext_size, subdirs, batches
+
+
+def _file_dict_from_row(row: _RawEntry) -> dict:
+    """Map a raw walk row onto the FileEntry field names."""
+    return {
+        "size": row.size,
+        "path": row.path,
+        "name": row.name,
+        "extension": row.ext,
+        "modified_time": datetime.fromtimestamp(row.mtime),
+        "created_time": datetime.fromtimestamp(row.ctime),
+        "accessed_time": datetime.fromtimestamp(row.atime),
+        "is_symlink": row.is_symlink,
+        "inode": row.ino,
+        "mode": row.mode,
+        "owner_uid": row.uid,
+        "group_gid": row.gid,
+        "size_human": human_size(row.size),
+    }
+
+
+def _file_entry_from_row(row: _RawEntry) -> FileEntry:
+    """Build a FileEntry from a raw walk row without re-validating trusted os.stat data."""
+    return FileEntry.model_construct(**_file_dict_from_row(row))
+
+
+def _walk_raw(
+    root_folder: str,
+    logger: logging.Logger,
+    extension_filter: Optional[str] = None,
+    stat_threads: Optional[int] = None,
+):
+    """Walk a directory tree, returning file count, total size, extension totals and unordered rows."""
+    file_count = 0
+    total_size = 0
+    ext_count = {}
+    ext_size = {}
+    rows = []
+    ext_filter = extension_filter.lower() if extension_filter else None
+
+    # Fan out one task per directory (plus one per extra stat batch of large
+    # directories); results are merged here, on the calling thread only
+    with ThreadPoolExecutor(max_workers=stat_threads or DEFAULT_STAT_THREADS) as pool:
+        pending = {pool.submit(_scan_dir, os.path.abspath(root_folder), logger, ext_filter)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dir_rows, dir_ext_count, dir_ext_size, subdirs, batches = future.result()
+                for subdir in subdirs:
+                    pending.add(pool.submit(_scan_dir, subdir, logger, ext_filter))
+                for batch_dir, batch in batches:
+                    pending.add(pool.submit(_stat_batch, batch_dir, batch, logger))
+
+                rows.extend(dir_rows)
+                file_count += len(dir_rows)
+                for ext, count in dir_ext_count.items():
+                    size = dir_ext_size[ext]
+                    total_size += size
+                    ext_count[ext] = ext_count.get(ext, 0) + count
+                    ext_size[ext] = ext_size.get(ext, 0) + size
+
+    extensions = {ext: {"count": count, "size": ext_size[ext]} for ext, count in ext_count.items()}
+
+    filter_msg = f" (filtered by extension: {extension_filter})" if extension_filter else ""
+    logger.info(f"Scanned {file_count} files{filter_msg}, total size {human_size(total_size)}")
+    return file_count, total_size, extensions, rows
+
+
+@dataclass(slots=True)
+class _CachedScan:
+    """One cached _walk_raw result; rows are sorted lazily the first time a caller needs them in order."""
+    mtime_ns: int
+    file_count: int
+    total_size: int
+    extensions: Dict[str, dict]
+    rows: List[_RawEntry]
+    sorted_rows: Optional[List[_RawEntry]] = None
+
+
+def _cached_scan(
+    root_folder: str,
+    logger: logging.Logger,
+    extension_filter: Optional[str] = None,
+    stat_threads: Optional[int] = None,
+    refresh: bool = False,
+) -> _CachedScan:
+    """Return the cached scan of a directory, walking it again if missing, stale or refresh is requested.
+
+    Entries are keyed on (root, extension filter) and hold the root's mtime, so
+    a change to the root directory invalidates its own entry; refresh only
+    evicts the requested entry. stat_threads does not change the result and is
+    not part of the key.
+    """
+    root_folder = os.path.abspath(root_folder)
+    ext_filter = extension_filter.lower() if extension_filter else None
+    key = (root_folder, ext_filter)
+    mtime_ns = os.stat(root_folder).st_mtime_ns
+    with _scan_cache_lock:
+        if refresh:
+            _scan_cache.pop(key, None)
+        entry = _scan_cache.get(key)
+        if entry is not None and entry.mtime_ns == mtime_ns:
+            _scan_cache.move_to_end(key)
+            return entry
+
+    entry = _CachedScan(mtime_ns, *_walk_raw(root_folder, logger, ext_filter, stat_threads))
+    with _scan_cache_lock:
+        _scan_cache[key] = entry
+        _scan_cache.move_to_end(key)
+        while len(_scan_cache) > SCAN_CACHE_SIZE:
+            _scan_cache.popitem(last=False)
+    return entry
+
+
+def _sorted_rows(entry: _CachedScan) -> List[_RawEntry]:
+    """Rows of a cached scan, largest first; the sort runs once per entry."""
+    if entry.sorted_rows is None:
+        entry.sorted_rows = sorted(entry.rows, key=_ROW_ORDER, reverse=True)
+    return entry.sorted_rows
+
+
+def _walk_cached(
+    root_folder: str,
+    logger: logging.Logger,
+    extension_filter: Optional[str] = None,
+    stat_threads: Optional[int] = None,
+    refresh: bool = False,
+    need_full_sort: bool = True,
+):
+    """Return _walk_raw results for a directory, reusing a previous scan unless refresh is requested.
+
+    Rows are sorted largest first when need_full_sort is set; otherwise they
+    come back unordered and callers pick what they need (see _largest_rows).
+    """
+    entry = _cached_scan(root_folder, logger, extension_filter, stat_threads, refresh)
+    rows = _sorted_rows(entry) if need_full_sort else entry.rows
+    return entry.file_count, entry.total_size, entry.extensions, rows
+
+
+def _largest_rows(rows: List[_RawEntry], n: int) -> List[_RawEntry]:
+    """Return the n largest rows in the same order a full sort would, in O(N log n)."""
+    return heapq.nlargest(n, rows, key=_ROW_ORDER)
+
+
+def _page_rows(entry: _CachedScan, offset: int, limit: int) -> List[_RawEntry]:
+    """Return one page of a cached scan's rows, largest first.
+
+    Shallow pages on an unsorted scan use _largest_rows; deeper pages, or scans
+    already sorted (e.g. by /analyze), slice the sorted rows, which are then
+    reused by every later page.
+    """
+    end = offset + limit
+    if entry.sorted_rows is None and end <= PARTIAL_SORT_WINDOW:
+        return _largest_rows(entry.rows, end)[offset:]
+    return _sorted_rows(entry)[offset:end]
+
+
+def _build_report(file_count: int, total_size: int, extensions: Dict[str, dict], rows: List[_RawEntry]) -> Report:
+    """Assemble a full Report from _walk_raw results."""
+    all_files = [_file_entry_from_row(row) for row in rows]
     ext_stats = {
-        k: ExtensionStats(count=v["count"], size=v["size"])
+        k: ExtensionStats.model_construct(count=v["count"], size=v["size"], size_human=human_size(v["size"]))
         for k, v in extensions.items()
     }
 
-    filter_msg = f" (filtered by extension: {extension_filter})" if extension_filter else ""
-    logger.info(f"Scanned {file_count} files{filter_msg}, total size {naturalsize(total_size)}")
-    return Report(
+    return Report.model_construct(
         file_count=file_count,
         total_size=total_size,
         extensions=ext_stats,
         largest_files=all_files[:10],
         all_files=all_files,
+        total_size_human=human_size(total_size),
     )
 
 
-def is_safe_path(file_path: str) -> bool:
-    """Check if the file path is safe (no directory traversal attacks)."""
+def _extension_dicts(extensions: Dict[str, dict]) -> Dict[str, dict]:
+    """Map raw extension totals onto the ExtensionStats field names."""
+    return {
+        k: {"count": v["count"], "size": v["size"], "size_human": human_size(v["size"])}
+        for k, v in extensions.items()
+    }
+
+
+def _render_report_json(file_count: int, total_size: int, extensions: Dict[str, dict], rows: List[_RawEntry]) -> bytes:
+    """Encode _walk_raw results as Report-shaped JSON without building any models."""
+    all_files = [_file_dict_from_row(row) for row in rows]
+    return orjson.dumps({
+        "file_count": file_count,
+        "total_size": total_size,
+        "extensions": _extension_dicts(extensions),
+        "largest_files": all_files[:10],
+        "all_files": all_files,
+        "total_size_human": human_size(total_size),
+    })
+
+
+def _render_report_ndjson(file_count: int, total_size: int, extensions: Dict[str, dict], rows: List[_RawEntry]):
+    """Yield _walk_raw results as NDJSON: a summary line, then one line per file, largest first."""
+    yield orjson.dumps({
+        "file_count": file_count,
+        "total_size": total_size,
+        "total_size_human": human_size(total_size),
+        "extensions": _extension_dicts(extensions),
+    }) + b"\n"
+
+    # Emit several lines per chunk so each chunk is worth a trip through the threadpool
+    for i in range(0, len(rows), NDJSON_CHUNK_ROWS):
+        yield b"".join(
+            orjson.dumps(_file_dict_from_row(row)) + b"\n"
+            for row in rows[i:i + NDJSON_CHUNK_ROWS]
+        )
+
+
+def _model_json_response(model: BaseModel) -> Response:
+    """Encode a model built with model_construct as a JSON Response.
+
+    Returning the model itself would make FastAPI dump it and validate it again
+    against the route's response_model.
+    """
+    return Response(content=orjson.dumps(model.model_dump()), media_type="application/json")
+
+
+def collect_file_stats(
+    root_folder: str,
+    logger: logging.Logger,
+    extension_filter: Optional[str] = None,
+    stat_threads: Optional[int] = None,
+    refresh: bool = False,
+) -> Report:
+    return _build_report(*_walk_cached(root_folder, logger, extension_filter, stat_threads, refresh))
+
+
+def _resolve_path(file_path: str) -> str:
+    """Resolve a path with os.path.realpath, caching the result for SAFE_PATH_CACHE_TTL seconds.
+
+    /file-info and /stream are typically requested back to back for the same path.
+    """
+    now = time.monotonic()
+    cached = _resolved_path_cache.get(file_path)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    if len(_resolved_path_cache) >= SAFE_PATH_CACHE_SIZE:
+        _resolved_path_cache.clear()
+    resolved_path = os.path.realpath(file_path)
+    _resolved_path_cache[file_path] = (now + SAFE_PATH_CACHE_TTL, resolved_path)
+    return resolved_path
+
+
+def _is_allowed(resolved_path: str) -> bool:
+    """Check a resolved path against ALLOWED_ROOTS."""
+    return not ALLOWED_ROOTS or any(
+        os.path.commonpath((root, resolved_path)) == root for root in ALLOWED_ROOTS
+    )
+
+
+def _is_allowed_dir(path: str) -> bool:
+    """Check that path is a directory inside ALLOWED_ROOTS, for the /analyze endpoints."""
     try:
-        # Resolve the path and check if it's within allowed bounds
-        resolved_path = os.path.realpath(file_path)
-        return os.path.exists(resolved_path) and os.path.isfile(resolved_path)
+        return os.path.isdir(path) and _is_allowed(os.path.realpath(path))
     except (OSError, ValueError):
         return False
 
 
-def generate_file_chunks(file_path: str, chunk_size: int = 8192):
-    """Generate file chunks for streaming."""
+def is_safe_path(file_path: str) -> Optional[Tuple[str, os.stat_result]]:
+    """Check if the file path is safe (no directory traversal attacks).
+
+    Returns the resolved path of the regular file and its stat result, or None
+    if the path is unsafe or does not exist. Callers open the resolved path, so
+    the file served is the one that was checked.
+    """
     try:
-        with open(file_path, 'rb') as file:
-            while chunk := file.read(chunk_size):
-                yield chunk
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
+        # Resolve the path and check if it's within allowed bounds
+        resolved_path = _resolve_path(file_path)
+        if not _is_allowed(resolved_path):
+            return None
+        stats = os.stat(resolved_path)
+    except (OSError, ValueError):
+        return None
+    return (resolved_path, stats) if stat.S_ISREG(stats.st_mode) else None
+
+
+def build_file_info(file_path: str, resolved_path: str, target_stats: os.stat_result) -> FileInfoResponse:
+    """Build the FileInfoResponse for a file already checked by is_safe_path."""
+    # With no symlink anywhere in the path, the target's stat is also the link-level stat
+    if resolved_path == os.path.abspath(file_path):
+        stats = target_stats
+    else:
+        stats = os.stat(file_path, follow_symlinks=False)
+    filename = os.path.basename(file_path)
+    ext = os.path.splitext(filename)[1].lower()
+    query = urlencode({"file_path": file_path})
+
+    return FileInfoResponse.model_construct(
+        path=os.path.abspath(file_path),
+        name=filename,
+        extension=ext,
+        size=stats.st_size,
+        size_human=human_size(stats.st_size),
+        content_type=get_content_type(filename),
+        modified_time=datetime.fromtimestamp(stats.st_mtime).isoformat(),
+        created_time=datetime.fromtimestamp(stats.st_ctime).isoformat(),
+        accessed_time=datetime.fromtimestamp(stats.st_atime).isoformat(),
+        is_symlink=stat.S_ISLNK(stats.st_mode),
+        inode=stats.st_ino,
+        mode=stats.st_mode,
+        owner_uid=stats.st_uid,
+        group_gid=stats.st_gid,
+        stream_url=f"/stream?{query}",
+        download_url=f"/stream?{query}&download=true"
+    )
 
 
-def get_content_type(file_path: str) -> str:
-    """Get the appropriate content type for a file."""
-    content_type, _ = mimetypes.guess_type(file_path)
+class LargeChunkFileResponse(FileResponse):
+    """FileResponse that reads 1 MiB chunks when the server cannot send the file path directly."""
+    chunk_size = STREAM_CHUNK_SIZE
+
+
+@lru_cache(maxsize=1024)
+def _content_type_for_suffix(suffix: str) -> str:
+    content_type, _ = mimetypes.guess_type(f"file{suffix}")
     return content_type or 'application/octet-stream'
 
 
+def get_content_type(filename: str) -> str:
+    """Get the appropriate content type for a file name.
+
+    Only the last two suffixes matter to mimetypes (e.g. '.tar.gz'), so they are
+    lower-cased and used as the cache key.
+    """
+    stem, ext = os.path.splitext(filename.lower())
+    return _content_type_for_suffix(os.path.splitext(stem)[1] + ext)
+
+
 # ---------- FastAPI App ----------
 app = FastAPI(
     title="File Statistics API",
@@ -265,53 +680,77 @@ def root():
 
 
 @app.get("/analyze", response_model=Report, summary="Full analysis of all files")
-def analyze_directory(
+async def analyze_directory(
     path: str, 
     extension: Optional[str] = Query(None, description="Filter by file extension (e.g., '.py', '.txt')"),
+    stat_threads: Optional[int] = Query(None, ge=1, le=128, description="Number of threads used to scan directories concurrently"),
+    refresh: bool = Query(False, description="Ignore cached scan results and re-walk the directory"),
     logger: logging.Logger = Depends(get_logger)
 ):
-    if not os.path.isdir(path):
+    if not await run_in_threadpool(_is_allowed_dir, path):
         logger.error(f"Invalid path requested: {path}")
         raise HTTPException(status_code=400, detail="Invalid directory path")
     logger.info(f"Analyzing directory: {path}")
-    return collect_file_stats(path, logger, extension)
+    walk = await run_in_threadpool(_walk_cached, path, logger, extension, stat_threads, refresh)
+    # Encode straight from the raw rows in the threadpool; returning a Report from an
+    # async handler would make FastAPI dump and re-validate it on the event loop
+    content = await run_in_threadpool(_render_report_json, *walk)
+    return Response(content=content, media_type="application/json")
+
+
+@app.get("/analyze/stream", summary="Full analysis streamed as NDJSON")
+async def analyze_directory_stream(
+    path: str,
+    extension: Optional[str] = Query(None, description="Filter by file extension (e.g., '.py', '.txt')"),
+    stat_threads: Optional[int] = Query(None, ge=1, le=128, description="Number of threads used to scan directories concurrently"),
+    refresh: bool = Query(False, description="Ignore cached scan results and re-walk the directory"),
+    logger: logging.Logger = Depends(get_logger)
+):
+    """Stream the analysis as newline-delimited JSON: a summary line, then one line per file, largest first."""
+    if not await run_in_threadpool(_is_allowed_dir, path):
+        logger.error(f"Invalid path for streaming analysis: {path}")
+        raise HTTPException(status_code=400, detail="Invalid directory path")
+    logger.info(f"Streaming analysis of directory: {path}")
+    walk = await run_in_threadpool(_walk_cached, path, logger, extension, stat_threads, refresh)
+    return StreamingResponse(_render_report_ndjson(*walk), media_type="application/x-ndjson")
 
 
 @app.get("/analyze/extensions", response_model=ExtensionListResponse, summary="Get all available extensions in directory")
-def get_available_extensions(
+async def get_available_extensions(
     path: str,
+    refresh: bool = Query(False, description="Ignore cached scan results and re-walk the directory"),
     logger: logging.Logger = Depends(get_logger)
 ):
     """Get a list of all file extensions available in the specified directory."""
-    if not os.path.isdir(path):
+    if not await run_in_threadpool(_is_allowed_dir, path):
         logger.error(f"Invalid path for extensions: {path}")
         raise HTTPException(status_code=400, detail="Invalid directory path")
     
     logger.info(f"Getting available extensions in: {path}")
-    report = collect_file_stats(path, logger)
+    file_count, _, extensions, _ = await run_in_threadpool(_walk_cached, path, logger, refresh=refresh, need_full_sort=False)
     
     # Sort extensions by count (most common first)
     sorted_extensions = sorted(
-        report.extensions.items(), 
-        key=lambda x: x[1].count, 
+        extensions.items(), 
+        key=lambda x: x[1]["count"], 
         reverse=True
     )
     
     extensions_info = [
-        ExtensionInfo(
+        ExtensionInfo.model_construct(
             extension=ext,
-            count=stats.count,
-            size=stats.size,
-            size_human=naturalsize(stats.size)
+            count=stats["count"],
+            size=stats["size"],
+            size_human=human_size(stats["size"])
         )
         for ext, stats in sorted_extensions
     ]
     
-    return ExtensionListResponse(
+    return _model_json_response(ExtensionListResponse.model_construct(
         path=path,
-        total_files=report.file_count,
+        total_files=file_count,
         extensions=extensions_info
-    )
+    ))
 
 
 @app.get("/stream", summary="Stream file contents")
@@ -323,79 +762,45 @@ def stream_file(
     """Stream file contents with appropriate content type detection."""
     
     # Security check
-    if not is_safe_path(file_path):
+    safe_file = is_safe_path(file_path)
+    if safe_file is None:
         logger.error(f"Invalid or unsafe file path requested: {file_path}")
         raise HTTPException(status_code=400, detail="Invalid file path or file does not exist")
+    resolved_path, file_stats = safe_file
     
-    try:
-        # Get file info
-        file_stats = os.stat(file_path)
-        file_size = file_stats.st_size
-        filename = os.path.basename(file_path)
-        content_type = get_content_type(file_path)
-        
-        logger.info(f"Streaming file: {file_path} ({naturalsize(file_size)})")
-        
-        # Prepare headers
-        headers = {
-            "Content-Length": str(file_size),
-            "Accept-Ranges": "bytes",
-        }
-        
-        # Set content disposition
-        disposition = "attachment" if download else "inline"
-        headers["Content-Disposition"] = f'{disposition}; filename="{filename}"'
-        
-        # Create streaming response
-        return StreamingResponse(
-            generate_file_chunks(file_path),
-            media_type=content_type,
-            headers=headers
-        )
-        
-    except Exception as e:
-        logger.error(f"Error streaming file {file_path}: {e}")
-        raise HTTPException(status_code=500, detail=f"Error streaming file: {str(e)}")
+    filename = os.path.basename(file_path)
+    content_type = get_content_type(filename)
+    logger.info(f"Streaming file: {file_path} ({human_size(file_stats.st_size)})")
+    
+    # FileResponse sets Content-Length/Accept-Ranges, serves Range requests
+    # and lets the server use sendfile where available. The file is only opened
+    # once the response is sent, so read errors surface there, not in this handler
+    return LargeChunkFileResponse(
+        resolved_path,
+        media_type=content_type,
+        filename=filename,
+        stat_result=file_stats,
+        content_disposition_type="attachment" if download else "inline",
+    )
 
 
 @app.get("/file-info", response_model=FileInfoResponse, summary="Get file information without streaming content")
-def get_file_info(
+async def get_file_info(
     file_path: str = Query(..., description="Full path to the file"),
     logger: logging.Logger = Depends(get_logger)
 ):
     """Get detailed information about a specific file without streaming its content."""
     
     # Security check
-    if not is_safe_path(file_path):
+    safe_file = await run_in_threadpool(is_safe_path, file_path)
+    if safe_file is None:
         logger.error(f"Invalid or unsafe file path requested: {file_path}")
         raise HTTPException(status_code=400, detail="Invalid file path or file does not exist")
     
     try:
-        stats = os.stat(file_path, follow_symlinks=False)
-        filename = os.path.basename(file_path)
-        ext = os.path.splitext(filename)[1].lower()
-        content_type = get_content_type(file_path)
-        
         logger.info(f"Getting info for file: {file_path}")
-        
-        return FileInfoResponse(
-            path=os.path.abspath(file_path),
-            name=filename,
-            extension=ext,
-            size=stats.st_size,
-            size_human=naturalsize(stats.st_size),
-            content_type=content_type,
-            modified_time=datetime.fromtimestamp(stats.st_mtime).isoformat(),
-            created_time=datetime.fromtimestamp(stats.st_ctime).isoformat(),
-            accessed_time=datetime.fromtimestamp(stats.st_atime).isoformat(),
-            is_symlink=os.path.islink(file_path),
-            inode=stats.st_ino,
-            mode=stats.st_mode,
-            owner_uid=stats.st_uid,
-            group_gid=stats.st_gid,
-            stream_url=f"/stream?file_path={file_path}",
-            download_url=f"/stream?file_path={file_path}&download=true"
-        )
+        file_info = await run_in_threadpool(build_file_info, file_path, *safe_file)
+        return _model_json_response(file_info)
         
     except Exception as e:
         logger.error(f"Error getting file info for {file_path}: {e}")
@@ -403,19 +808,21 @@ def get_file_info(
 
 
 @app.get("/analyze/files", response_model=PaginatedFiles, summary="Paginated file list")
-def get_paginated_files(
+async def get_paginated_files(
     path: str,
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
     extension: Optional[str] = Query(None, description="Filter by file extension (e.g., '.py', '.txt')"),
+    refresh: bool = Query(False, description="Ignore cached scan results and re-walk the directory"),
     logger: logging.Logger = Depends(get_logger),
 ):
-    if not os.path.isdir(path):
+    if not await run_in_threadpool(_is_allowed_dir, path):
         logger.error(f"Invalid path for pagination: {path}")
         raise HTTPException(status_code=400, detail="Invalid directory path")
     
     logger.info(f"Paginating files in: {path}, offset={offset}, limit={limit}")
-    report = collect_file_stats(path, logger, extension)
-    total = len(report.all_files)
-    results = report.all_files[offset:offset + limit]
-    return PaginatedFiles(total=total, limit=limit, offset=offset, results=results)
+    scan = await run_in_threadpool(_cached_scan, path, logger, extension, refresh=refresh)
+    page_rows = await run_in_threadpool(_page_rows, scan, offset, limit)
+    results = [_file_entry_from_row(row) for row in page_rows]
+    page = PaginatedFiles.model_construct(total=scan.file_count, limit=limit, offset=offset, results=results)
+    return await run_in_threadpool(_model_json_response, page)